@@ -47,6 +47,8 @@ int main() {
     pthread_t t1, t2;
     int id0 = 0, id1 = 1;
     
+    // Line-buffer stdout so output streams when piped
+    setvbuf(stdout, NULL, _IOLBF, 0);
     printf("=== Peterson's Algorithm Demonstration ===\n");
     printf("Expected final value: %d\n", ITERATIONS);
     printf("Starting threads with Peterson's mutual exclusion...\n\n");
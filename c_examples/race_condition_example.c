@@ -31,6 +31,8 @@ void* increment_counter(void* arg) {
 int main() {
     pthread_t t1, t2;
     
+    // Line-buffer stdout so output streams when piped
+    setvbuf(stdout, NULL, _IOLBF, 0);
     printf("=== Race Condition Demonstration ===\n");
     printf("Expected final value: %d\n", ITERATIONS);
     printf("Starting threads without synchronization...\n\n");
@@ -1,33 +1,46 @@
 
+import contextlib
+import glob
+import io
 import os
 import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Project layout, resolved once at import
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+C_DIR = os.path.join(PROJECT_ROOT, "c_examples")
+ANIM_DIR = os.path.join(PROJECT_ROOT, "animations")
+
+_PATHS = {
+    "race_graph": os.path.join(ANIM_DIR, "race_condition_graph.png"),
+    "race_timeline": os.path.join(ANIM_DIR, "race_condition_timeline.png"),
+    "peterson_graph": os.path.join(ANIM_DIR, "peterson_graph.png"),
+    "peterson_timeline": os.path.join(ANIM_DIR, "peterson_timeline.png"),
+}
 
 
 def main():
     print("=" * 60)
     print("  Race Condition Visualizer")
-    print("  Graph-Theoretic Modeling with NetworkX + Matplotlib")
+    print("  Graph-Theoretic Modeling with Matplotlib")
     print("=" * 60)
     print()
 
-    # Get project root directory
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    c_examples_dir = os.path.join(project_root, "c_examples")
-    animations_dir = os.path.join(project_root, "animations")
-
     # Create directories if needed
-    os.makedirs(animations_dir, exist_ok=True)
+    os.makedirs(ANIM_DIR, exist_ok=True)
 
     
-    race_c = os.path.join(c_examples_dir, "race_condition_example.c")
-    peterson_c = os.path.join(c_examples_dir, "peterson_algorithm.c")
+    race_c = os.path.join(C_DIR, "race_condition_example.c")
+    peterson_c = os.path.join(C_DIR, "peterson_algorithm.c")
 
     if os.path.exists(race_c) and os.path.exists(peterson_c):
         print("C example files found")
-        compile_c_examples(c_examples_dir)
+        compile_c_examples(C_DIR)
     else:
-        print("Warning: C example files not found in", c_examples_dir)
+        print("Warning: C example files not found in", C_DIR)
 
     print()
     print("=" * 60)
@@ -45,43 +58,63 @@ def main():
 
     choice = input("\nEnter your choice: ").strip()
     
-    # Import graph visualizer
-    sys.path.insert(0, os.path.join(project_root, "src"))
-    from visualizations.graph_visualizer import (
-        visualize_race_condition_graph,
-        visualize_race_condition_timeline,
-        visualize_peterson_graph,
-        visualize_peterson_timeline
-    )
+    # Import graph visualizer only when needed (matplotlib is slow to load)
+    if choice in {"1", "2", "3", "4", "7"}:
+        sys.path.insert(0, os.path.join(PROJECT_ROOT, "src"))
+        from visualizations.graph_visualizer import (
+            visualize_race_condition_graph,
+            visualize_race_condition_timeline,
+            visualize_peterson_graph,
+            visualize_peterson_timeline
+        )
     
     if choice == "1":
         print("\nGenerating race condition state graph...")
-        visualize_race_condition_graph(os.path.join(animations_dir, "race_condition_graph.png"))
+        visualize_race_condition_graph(_PATHS["race_graph"])
     elif choice == "2":
         print("\nGenerating race condition timeline...")
-        visualize_race_condition_timeline(os.path.join(animations_dir, "race_condition_timeline.png"))
+        visualize_race_condition_timeline(_PATHS["race_timeline"])
     elif choice == "3":
         print("\nGenerating Peterson's algorithm state graph...")
-        visualize_peterson_graph(os.path.join(animations_dir, "peterson_graph.png"))
+        visualize_peterson_graph(_PATHS["peterson_graph"])
     elif choice == "4":
         print("\nGenerating Peterson's algorithm timeline...")
-        visualize_peterson_timeline(os.path.join(animations_dir, "peterson_timeline.png"))
+        visualize_peterson_timeline(_PATHS["peterson_timeline"])
     elif choice == "5":
-        run_c_example(c_examples_dir, "race_condition")
+        run_c_example(C_DIR, "race_condition")
     elif choice == "6":
-        run_c_example(c_examples_dir, "peterson")
+        run_c_example(C_DIR, "peterson")
     elif choice == "7":
         print("\nGenerating all visualizations...")
-        visualize_race_condition_graph(os.path.join(animations_dir, "race_condition_graph.png"))
-        visualize_race_condition_timeline(os.path.join(animations_dir, "race_condition_timeline.png"))
-        visualize_peterson_graph(os.path.join(animations_dir, "peterson_graph.png"))
-        visualize_peterson_timeline(os.path.join(animations_dir, "peterson_timeline.png"))
+        tasks = [
+            (visualize_race_condition_graph, _PATHS["race_graph"]),
+            (visualize_race_condition_timeline, _PATHS["race_timeline"]),
+            (visualize_peterson_graph, _PATHS["peterson_graph"]),
+            (visualize_peterson_timeline, _PATHS["peterson_timeline"]),
+        ]
+        # Render in separate processes so each figure gets its own pyplot state.
+        # Workers hand back their output so the parent prints it in order.
+        workers = min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render_quietly, fn, path) for fn, path in tasks]
+            for future in futures:
+                print(future.result(), end='')
         print("\nAll visualizations complete! Check the animations/ directory")
     elif choice == "0":
         print("Goodbye!")
         sys.exit(0)
     else:
         print("Invalid choice")
+
+
+def _render_quietly(fn, path):
+    """Run a visualizer in a worker process and return what it printed"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        fn(path)
+    return out.getvalue()
+
+
 def compile_c_examples(c_dir):
     """Compile C examples and generate assembly"""
     print("\nCompiling C examples...")
@@ -91,37 +124,60 @@ def compile_c_examples(c_dir):
         ("peterson_algorithm.c", "peterson"),
     ]
 
-    for src, out in examples:
-        src_path = os.path.join(c_dir, src)
-        if not os.path.exists(src_path):
-            continue
+    # gcc runs in child processes, so threads are enough to overlap the builds
+    workers = min(len(examples), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_build_c_example, c_dir, src, out) for src, out in examples]
+        for future in futures:
+            try:
+                status = future.result()
+            except FileNotFoundError:
+                print("  Error: gcc not found. Install MinGW-w64 for Windows")
+                print("    Download: https://www.mingw-w64.org/")
+                break
+            if status:
+                print(status)
+
+
+def _build_c_example(c_dir, src, out):
+    """Compile a single C example and return its status line"""
+    src_path = os.path.join(c_dir, src)
+    if not os.path.exists(src_path):
+        return None
+
+    asm_path = os.path.join(c_dir, f"{out}.s")
+    exe_path = os.path.join(c_dir, f"{out}.exe")
+
+    # Skip sources whose outputs are already newer than the source
+    src_mtime = os.path.getmtime(src_path)
+    if all(
+        os.path.exists(p) and os.path.getmtime(p) >= src_mtime
+        for p in (asm_path, exe_path)
+    ):
+        return f"  {src} is up to date"
 
-        try:
-            # Generate 
-            asm_path = os.path.join(c_dir, f"{out}.s")
-            subprocess.run(
-                ["gcc", "-O0", "-g", "-S", src_path, "-o", asm_path],
-                check=True,
-                capture_output=True,
-            )
-
-            # Compile 
-            exe_path = os.path.join(c_dir, f"{out}.exe")
+    try:
+        # Compile and keep the assembly from the same gcc run.
+        # Intermediates land in a scratch dir since their names vary by gcc version.
+        with tempfile.TemporaryDirectory(dir=c_dir) as build_dir:
+            tmp_exe = os.path.join(build_dir, os.path.basename(exe_path))
             subprocess.run(
-                ["gcc", "-O0", "-g", src_path, "-o", exe_path, "-lpthread"],
+                ["gcc", "-O0", "-g", "-save-temps=obj", src_path, "-o", tmp_exe, "-lpthread"],
                 check=True,
                 capture_output=True,
             )
+            asm_files = glob.glob(os.path.join(build_dir, "*.s"))
+            if not asm_files:
+                return f"  Error compiling {src}\n    gcc wrote no assembly file"
+            os.replace(asm_files[0], asm_path)
+            os.replace(tmp_exe, exe_path)
+    except subprocess.CalledProcessError as e:
+        status = f"  Error compiling {src}"
+        if e.stderr:
+            status += f"\n    {e.stderr.decode()}"
+        return status
 
-            print(f"  Compiled {src}")
-        except subprocess.CalledProcessError as e:
-            print(f"  Error compiling {src}")
-            if e.stderr:
-                print(f"    {e.stderr.decode()}")
-        except FileNotFoundError:
-            print("  Error: gcc not found. Install MinGW-w64 for Windows")
-            print("    Download: https://www.mingw-w64.org/")
-            break
+    return f"  Compiled {src}"
 
 
 def run_c_example(c_dir, example_name):
@@ -136,12 +192,39 @@ def run_c_example(c_dir, example_name):
     print(f"\n Running {example_name}...")
     print("=" * 60)
     try:
-        result = subprocess.run([exe_path], capture_output=True, timeout=10, encoding='utf-8', errors='replace')
-        print(result.stdout)
-        if result.stderr:
-            print("Errors:", result.stderr)
-    except subprocess.TimeoutExpired:
-        print("Error: Program timed out (possible infinite loop)")
+        # Stream stdout as it arrives; stderr is drained on a thread and
+        # reported afterwards so a full stderr pipe cannot stall the program
+        with subprocess.Popen(
+            [exe_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=1,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+        ) as proc:
+            timed_out = threading.Event()
+
+            def kill_on_timeout():
+                timed_out.set()
+                proc.kill()
+
+            errors = []
+            reader = threading.Thread(target=lambda: errors.append(proc.stderr.read()))
+            reader.start()
+            timer = threading.Timer(10, kill_on_timeout)
+            timer.start()
+            try:
+                for line in proc.stdout:
+                    print(line, end='')
+                proc.wait()
+            finally:
+                timer.cancel()
+                reader.join()
+        if errors and errors[0]:
+            print("Errors:", errors[0])
+        if timed_out.is_set():
+            print("Error: Program timed out (possible infinite loop)")
     except Exception as e:
         print(f"Error running example: {e}")
     print("=" * 60)
@@ -4,6 +4,8 @@ Used to generate state graphs for visualization.
 """
 
 from dataclasses import dataclass
+import functools
+import weakref
 from typing import List, Tuple, Optional
 from enum import Enum
 
@@ -16,9 +18,10 @@ class ProcessState(Enum):
     WRITING = "WRITING"
     WAITING = "WAITING"
     CRITICAL = "CRITICAL"
+    DONE = "DONE"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SystemState:
     """Represents a system state in concurrent execution"""
 
@@ -28,35 +31,10 @@ class SystemState:
     flag1: bool = False
     flag2: bool = False
     turn: int = 0
-
-    def __hash__(self):
-        return hash(
-            (
-                self.p1_state.value,
-                self.p2_state.value,
-                self.counter,
-                self.flag1,
-                self.flag2,
-                self.turn,
-            )
-        )
-
-    def __eq__(self, other):
-        return (
-            self.p1_state == other.p1_state
-            and self.p2_state == other.p2_state
-            and self.counter == other.counter
-            and self.flag1 == other.flag1
-            and self.flag2 == other.flag2
-            and self.turn == other.turn
-        )
-
-    def is_race_condition(self) -> bool:
-        """Check if this state represents a race condition"""
-        return self.p1_state in [
-            ProcessState.READING,
-            ProcessState.WRITING,
-        ] and self.p2_state in [ProcessState.READING, ProcessState.WRITING]
+    pc1: int = 0  # Program counter of each process
+    pc2: int = 0
+    reg1: int = 0  # Value each process last read from counter
+    reg2: int = 0
 
     def is_mutual_exclusion_violated(self) -> bool:
         """Check if mutual exclusion is violated"""
@@ -84,7 +62,16 @@ class Transition:
 
 
 class RaceConditionStateMachine:
-    """State machine for race condition scenario"""
+    """
+    State machine for race condition scenario.
+
+    Each process runs an unsynchronized increment: read counter into a
+    register, write register + 1 back, then finish. The states are every
+    interleaving reachable from the initial state.
+    """
+
+    # Process state after each program counter value
+    PROGRAM = (ProcessState.IDLE, ProcessState.READING, ProcessState.WRITING, ProcessState.DONE)
 
     def __init__(self):
         self.states: List[SystemState] = []
@@ -92,45 +79,69 @@ class RaceConditionStateMachine:
         self._generate_states()
 
     def _generate_states(self):
-        """Generate all possible states for race condition scenario"""
-        # Initial state
-        s0 = SystemState(ProcessState.IDLE, ProcessState.IDLE, 0)
-
-        # P1 reads first
-        s1 = SystemState(ProcessState.READING, ProcessState.IDLE, 0)
-        s2 = SystemState(ProcessState.WRITING, ProcessState.IDLE, 1)
-        s3 = SystemState(ProcessState.IDLE, ProcessState.IDLE, 1)
-
-        # P2 reads first
-        s4 = SystemState(ProcessState.IDLE, ProcessState.READING, 0)
-        s5 = SystemState(ProcessState.IDLE, ProcessState.WRITING, 1)
-
-        # Both read (RACE!)
-        s6 = SystemState(ProcessState.READING, ProcessState.READING, 0)
-        s7 = SystemState(ProcessState.WRITING, ProcessState.READING, 0)
-        s8 = SystemState(ProcessState.WRITING, ProcessState.WRITING, 1)  # Lost update!
-        s9 = SystemState(ProcessState.IDLE, ProcessState.WRITING, 1)
-
-        self.states = [s0, s1, s2, s3, s4, s5, s6, s7, s8, s9]
-
-        # Define transitions
-        self.transitions = [
-            Transition(s0, s1, "P1 reads counter", 1),
-            Transition(s1, s2, "P1 writes counter", 1),
-            Transition(s2, s3, "P1 done", 1),
-            Transition(s0, s4, "P2 reads counter", 2),
-            Transition(s4, s5, "P2 writes counter", 2),
-            Transition(s5, s3, "P2 done", 2),
-            # Race condition path
-            Transition(s0, s6, "BOTH read (same value!)", 0),
-            Transition(s6, s7, "P1 writes", 1),
-            Transition(s7, s9, "P2 writes (overwrites P1!)", 2),
-            Transition(s6, s8, "BOTH write", 0),
-        ]
+        """Generate every reachable state by DFS over both processes' next steps"""
+        initial = SystemState(ProcessState.IDLE, ProcessState.IDLE, 0)
+        visited = {initial: initial}
+        self._race_witnesses: List[SystemState] = []
+        self.states = [initial]
+        stack = [initial]
+
+        while stack:
+            state = stack.pop()
+            for step in (self._step(state, 1), self._step(state, 2)):
+                if step is None:
+                    continue
+                action, process, next_state = step
+                # Reuse the instance already found so transitions share states
+                known = visited.get(next_state)
+                if known is None:
+                    visited[next_state] = known = next_state
+                    self.states.append(next_state)
+                    stack.append(next_state)
+
+                    # A race witness holds a counter no serial schedule gives:
+                    # run serially, each finished write adds exactly one
+                    if next_state.counter != (next_state.pc1 >= 2) + (next_state.pc2 >= 2):
+                        self._race_witnesses.append(next_state)
+                self.transitions.append(Transition(state, known, action, process))
+
+        self._state_index = {id(s): i for i, s in enumerate(self.states)}
+
+    def _step(self, state: SystemState, process: int) -> Optional[Tuple[str, int, SystemState]]:
+        """Return (action, process, next state) for a process's next step"""
+        pc = state.pc1 if process == 1 else state.pc2
+        reg = state.reg1 if process == 1 else state.reg2
+        counter = state.counter
+
+        if pc == 0:
+            action, reg = f"P{process} reads counter", counter
+        elif pc == 1:
+            action, counter = f"P{process} writes counter", reg + 1
+        elif pc == 2:
+            action = f"P{process} done"
+        else:
+            return None
+
+        pc += 1
+        if process == 1:
+            next_state = SystemState(self.PROGRAM[pc], state.p2_state, counter,
+                                     pc1=pc, pc2=state.pc2, reg1=reg, reg2=state.reg2)
+        else:
+            next_state = SystemState(state.p1_state, self.PROGRAM[pc], counter,
+                                     pc1=state.pc1, pc2=pc, reg1=state.reg1, reg2=reg)
+        return action, process, next_state
 
     def get_race_states(self) -> List[SystemState]:
-        """Return states where race condition occurs"""
-        return [s for s in self.states if s.is_race_condition()]
+        """
+        Return states where race condition occurs: those whose counter
+        differs from the number of writes completed, as a serial schedule
+        would leave it.
+        """
+        return list(self._race_witnesses)
+
+    def index_of(self, state: SystemState) -> int:
+        """Return the position of a state owned by this machine"""
+        return self._state_index[id(state)]
 
 
 class PetersonStateMachine:
@@ -162,6 +173,7 @@ class PetersonStateMachine:
         s9 = SystemState(ProcessState.CRITICAL, ProcessState.WAITING, 1, True, True, 1)
 
         self.states = [s0, s1, s2, s3, s4, s5, s6, s7, s8, s9]
+        self._state_index = {id(s): i for i, s in enumerate(self.states)}
 
         # Define transitions (no mutual exclusion violation possible)
         self.transitions = [
@@ -182,12 +194,21 @@ class PetersonStateMachine:
         """Verify no state violates mutual exclusion"""
         return all(not s.is_mutual_exclusion_violated() for s in self.states)
 
+    def index_of(self, state: SystemState) -> int:
+        """Return the position of a state owned by this machine"""
+        return self._state_index[id(state)]
+
+
+# Machines whose traces are cached, keyed by id() so the cache holds no strong refs
+_trace_machines = weakref.WeakValueDictionary()
+
 
 def generate_execution_trace(
     state_machine, path_indices: List[int]
 ) -> List[Tuple[SystemState, str]]:
     """
     Generate an execution trace following a specific path through the state machine.
+    Results are memoized per (machine, path).
 
     Args:
         state_machine: Either RaceConditionStateMachine or PetersonStateMachine
@@ -196,13 +217,25 @@ def generate_execution_trace(
     Returns:
         List of (state, action) tuples
     """
+    sm_id = id(state_machine)
+    if sm_id not in _trace_machines:
+        _trace_machines[sm_id] = state_machine
+        # The id may be reused once this machine is collected, so drop stale entries
+        weakref.finalize(state_machine, _trace_impl.cache_clear)
+    return list(_trace_impl(sm_id, tuple(path_indices)))
+
+
+@functools.lru_cache(maxsize=128)
+def _trace_impl(sm_id: int, path: Tuple[int, ...]) -> Tuple[Tuple[SystemState, str], ...]:
+    """Follow path through the registered machine sm_id"""
+    state_machine = _trace_machines[sm_id]
     trace = [(state_machine.states[0], "Initial state")]
     current_state = state_machine.states[0]
 
-    for idx in path_indices:
+    for idx in path:
         transition = state_machine.transitions[idx]
-        if transition.from_state == current_state:
+        if transition.from_state is current_state:
             trace.append((transition.to_state, transition.action))
             current_state = transition.to_state
 
-    return trace
+    return tuple(trace)
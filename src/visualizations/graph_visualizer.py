@@ -1,10 +1,19 @@
 """
-Graph visualizations using NetworkX and Matplotlib.
+Graph visualizations using Matplotlib.
 Creates state transition graphs and timeline diagrams for race conditions and Peterson's algorithm.
+
+Figures are rendered with the non-interactive Agg backend, since every caller saves
+to a PNG. To display figures (output_path=None), switch to an interactive backend
+with plt.switch_backend() after importing this module.
 """
 
-import networkx as nx
+import matplotlib
+matplotlib.use("Agg")  # Skip GUI backend probing; must precede the pyplot import
 import matplotlib.pyplot as plt
+from matplotlib.patches import FancyArrowPatch
+import functools
+import math
+import shutil
 import sys
 import os
 
@@ -12,93 +21,224 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.state_machine import RaceConditionStateMachine, PetersonStateMachine, ProcessState
 
+# Pre-rendered timelines; the timeline figures take no input, so saving them is a file copy
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "assets")
+RACE_TIMELINE_TEMPLATE = os.path.join(ASSETS_DIR, "race_condition_timeline_template.png")
+PETERSON_TIMELINE_TEMPLATE = os.path.join(ASSETS_DIR, "peterson_timeline_template.png")
+
+_RACE_WITNESS_COLOR = '#FF6B6B'  # Red for detected race (lost update)
+
+# Node colors keyed on (p1_state, p2_state); race witnesses come from the state machine
+_RACE_NODE_COLORS = {
+    (ProcessState.IDLE, ProcessState.IDLE): '#4ECDC4',  # Cyan for initial
+    (ProcessState.DONE, ProcessState.DONE): '#95E1D3',  # Light green for final
+}
+_RACE_DEFAULT_COLOR = '#FFE66D'  # Yellow for normal states
+
+# Node colors keyed on (p1_state, p2_state)
+_PETERSON_NODE_COLORS = {
+    (p1, p2): '#95E1D3' if ProcessState.CRITICAL in (p1, p2)  # Green for critical section
+    else '#FFE66D' if ProcessState.WAITING in (p1, p2)  # Yellow for waiting
+    else '#4ECDC4'  # Cyan for idle
+    for p1 in ProcessState for p2 in ProcessState
+}
 
-def visualize_race_condition_graph(output_path=None):
+# Peterson shells from the center out: idle, waiting, critical section
+_PETERSON_SHELLS = (ProcessState.IDLE, ProcessState.WAITING, ProcessState.CRITICAL)
+
+_EDGE_RAD = 0.1
+
+
+def _race_layout(sm):
     """
-    Create a directed graph showing race condition state transitions.
-    Highlights the problematic paths where lost updates occur.
+    Place race states on the interleaving lattice: x is total progress
+    (pc1 + pc2), y is how far P1 is ahead of P2. States sharing both
+    program counters (different data) are stacked around their point.
     """
-    sm = RaceConditionStateMachine()
-    
-    # Create directed graph
-    G = nx.DiGraph()
-    
-    # Add nodes with state information
+    groups = {}
     for idx, state in enumerate(sm.states):
-        label = f"S{idx}\nP1:{state.p1_state.value[:3]}\nP2:{state.p2_state.value[:3]}\nC={state.counter}"
-        G.add_node(idx, label=label, state=state)
-    
-    # Add edges from transitions
+        groups.setdefault((state.pc1, state.pc2), []).append(idx)
+
+    pos = [None] * len(sm.states)
+    for (pc1, pc2), members in groups.items():
+        for k, idx in enumerate(members):
+            offset = 0.6 * (k - (len(members) - 1) / 2)
+            pos[idx] = (pc1 + pc2, pc1 - pc2 + offset)
+    return pos
+
+
+def _peterson_shell(state):
+    """
+    Return the shell index of a Peterson state (the furthest-along process decides).
+    Only IDLE, WAITING and CRITICAL process states are supported; any other
+    state raises ValueError.
+    """
+    return max(_PETERSON_SHELLS.index(state.p1_state), _PETERSON_SHELLS.index(state.p2_state))
+
+
+def _peterson_angle(state):
+    """
+    Return the preferred angle of a Peterson state: states where P1 is further
+    along sit on the right, P2 on the left, and contended states (both flags
+    set) above or below by turn, so each process's path stays on its own side.
+    """
+    lean = _PETERSON_SHELLS.index(state.p1_state) - _PETERSON_SHELLS.index(state.p2_state)
+    if state.flag1 and state.flag2:
+        side = 1 if state.turn == 1 else -1
+    else:
+        side = 1 if lean == 0 else 0
+    return math.atan2(side, lean)
+
+
+def _shell_layout(states, shell_of, angle_of):
+    """
+    Place states on concentric circles, one per shell index returned by
+    shell_of (closed form, like networkx's shell_layout). Each shell is
+    ordered by angle_of and spaced evenly from its first member's angle.
+    """
+    shells = {}
+    for idx, state in enumerate(states):
+        shells.setdefault(shell_of(state), []).append(idx)
+
+    pos = [None] * len(states)
+    n_shells = max(shells) + 1
+    for shell, members in shells.items():
+        radius = (shell + 1) / n_shells
+        members = sorted(members, key=lambda idx: angle_of(states[idx]))
+        offset = angle_of(states[members[0]])
+        for k, idx in enumerate(members):
+            theta = offset + 2 * math.pi * k / len(members)
+            pos[idx] = (radius * math.cos(theta), radius * math.sin(theta))
+    return pos
+
+
+def _draw_state_graph(ax, sm, pos, labels, node_colors, node_size, font_size,
+                      edge_font_size, max_action_len):
+    """
+    Draw a state machine as a directed graph on ax.
+    Nodes are placed at pos[i] for sm.states[i]; edges follow sm.transitions.
+    """
+    xs, ys = zip(*pos)
+    ax.scatter(xs, ys, s=node_size, c=node_colors, alpha=0.9,
+               edgecolors='black', linewidths=2, zorder=2)
+
+    for (x, y), label in zip(pos, labels):
+        ax.text(x, y, label, ha='center', va='center', fontsize=font_size,
+                fontweight='bold', zorder=3)
+
+    # Keep arrow heads outside the node markers
+    node_radius = math.sqrt(node_size) / 2
+
     for trans in sm.transitions:
-        from_idx = sm.states.index(trans.from_state)
-        to_idx = sm.states.index(trans.to_state)
-        G.add_edge(from_idx, to_idx, action=trans.action, process=trans.process)
-    
-    # Create figure
-    plt.figure(figsize=(16, 12))
-    
-    # Use spring layout for better visualization
-    pos = nx.spring_layout(G, k=2, iterations=50, seed=42)
-    
-    # Color nodes based on state type
-    node_colors = []
-    for idx in G.nodes():
-        state = sm.states[idx]
-        if state.is_race_condition():
-            node_colors.append('#FF6B6B')  # Red for race condition
-        elif state.p1_state == ProcessState.IDLE and state.p2_state == ProcessState.IDLE:
-            if state.counter == 0:
-                node_colors.append('#4ECDC4')  # Cyan for initial
-            else:
-                node_colors.append('#95E1D3')  # Light green for final
-        else:
-            node_colors.append('#FFE66D')  # Yellow for normal states
-    
-    # Draw the graph
-    nx.draw_networkx_nodes(G, pos, node_color=node_colors, 
-                          node_size=3000, alpha=0.9, edgecolors='black', linewidths=2)
-    
-    # Draw labels
-    labels = nx.get_node_attributes(G, 'label')
-    nx.draw_networkx_labels(G, pos, labels, font_size=9, font_weight='bold')
-    
-    # Draw edges with arrows
-    nx.draw_networkx_edges(G, pos, edge_color='gray', arrows=True,
-                          arrowsize=20, arrowstyle='->', width=2,
-                          connectionstyle='arc3,rad=0.1')
-    
-    # Add edge labels (process actions)
-    edge_labels = {}
-    for u, v, data in G.edges(data=True):
-        action = data['action']
-        if len(action) > 20:
-            action = action[:17] + "..."
-        edge_labels[(u, v)] = action
-    
-    nx.draw_networkx_edge_labels(G, pos, edge_labels, font_size=7)
+        (x1, y1) = pos[sm.index_of(trans.from_state)]
+        (x2, y2) = pos[sm.index_of(trans.to_state)]
+        ax.add_patch(FancyArrowPatch((x1, y1), (x2, y2), arrowstyle='->',
+                                     connectionstyle=f'arc3,rad={_EDGE_RAD}',
+                                     mutation_scale=20, color='gray', linewidth=2,
+                                     shrinkA=node_radius, shrinkB=node_radius, zorder=1))
+
+        action = trans.action
+        if len(action) > max_action_len:
+            action = action[:max_action_len - 3] + "..."
+
+        # Label sits at the midpoint of the arc3 curve, rotated along the edge
+        dx, dy = x2 - x1, y2 - y1
+        mx = (x1 + x2) / 2 + _EDGE_RAD / 2 * dy
+        my = (y1 + y2) / 2 - _EDGE_RAD / 2 * dx
+        angle = math.degrees(math.atan2(dy, dx))
+        if angle > 90:
+            angle -= 180
+        elif angle < -90:
+            angle += 180
+        ax.text(mx, my, action, ha='center', va='center', fontsize=edge_font_size,
+                rotation=angle, rotation_mode='anchor', transform_rotates_text=True,
+                bbox=dict(boxstyle='round', ec='white', fc='white'), zorder=1)
+
+    ax.margins(0.1)
+    ax.axis('off')
+
+
+def _prepare_figure(fig, figsize):
+    """Return fig cleared and resized for reuse, or a new figure if fig is None"""
+    if fig is None:
+        return plt.figure(figsize=figsize)
+    fig.clf()
+    fig.set_size_inches(figsize)
+    return fig
+
+
+@functools.lru_cache(maxsize=None)
+def _race_sm():
+    """Return the shared race condition state machine (built once per process)"""
+    return RaceConditionStateMachine()
+
+
+@functools.lru_cache(maxsize=None)
+def _peterson_sm():
+    """Return the shared Peterson state machine (built once per process)"""
+    return PetersonStateMachine()
+
+
+def visualize_race_condition_graph(output_path=None, fig=None):
+    """
+    Create a directed graph showing race condition state transitions.
+    Highlights the problematic paths where lost updates occur.
+    """
+    sm = _race_sm()
+    
+    # Node labels with state information
+    labels = [
+        f"S{idx}\nP1:{state.p1_state.value[:3]}\nP2:{state.p2_state.value[:3]}\nC={state.counter}"
+        f"\nr1={state.reg1} r2={state.reg2}"
+        for idx, state in enumerate(sm.states)
+    ]
+    
+    # Color nodes based on state type, with detected race witnesses in red
+    witnesses = {id(s) for s in sm.get_race_states()}
+    node_colors = [
+        _RACE_WITNESS_COLOR if id(s) in witnesses
+        else _RACE_NODE_COLORS.get((s.p1_state, s.p2_state), _RACE_DEFAULT_COLOR)
+        for s in sm.states
+    ]
+    
+    # Create figure and draw the graph
+    owns_fig = fig is None
+    fig = _prepare_figure(fig, (16, 12))
+    ax = fig.subplots()
+    _draw_state_graph(ax, sm, _race_layout(sm), labels, node_colors, node_size=3600,
+                      font_size=7, edge_font_size=7, max_action_len=20)
     
     # Add title and legend
-    plt.title("Race Condition State Transition Graph\n" + 
-             "Red = Race Condition States | Yellow = Normal | Cyan/Green = Initial/Final",
+    ax.set_title("Race Condition State Transition Graph\n" + 
+             "Red = Race Witness (Lost Update) | Yellow = Normal | Cyan/Green = Initial/Final",
              fontsize=16, fontweight='bold', pad=20)
     
-    plt.axis('off')
-    plt.tight_layout()
+    fig.tight_layout()
     
     if output_path:
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
+        fig.savefig(output_path, dpi=100)
         print(f"Saved race condition graph to {output_path}")
     else:
         plt.show()
     
-    plt.close()
+    if owns_fig:
+        plt.close(fig)
 
 
-def visualize_race_condition_timeline(output_path=None):
+def visualize_race_condition_timeline(output_path=None, use_template=True, fig=None):
     """
     Create a timeline visualization showing the race condition scenario.
+    Saving copies RACE_TIMELINE_TEMPLATE; pass use_template=False to render
+    with matplotlib instead (e.g. to regenerate the template).
     """
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10))
+    if output_path and use_template and os.path.exists(RACE_TIMELINE_TEMPLATE):
+        shutil.copyfile(RACE_TIMELINE_TEMPLATE, output_path)
+        print(f"Saved race condition timeline to {output_path}")
+        return
+    
+    owns_fig = fig is None
+    fig = _prepare_figure(fig, (14, 10))
+    ax1, ax2 = fig.subplots(2, 1)
     
     # Scenario 1: Safe execution (sequential)
     ax1.set_title("Safe Execution: Sequential Access", fontsize=14, fontweight='bold')
@@ -157,106 +297,78 @@ def visualize_race_condition_timeline(output_path=None):
     ax2.text(5, 0.3, 'Lost Update: Expected C=2, but got C=1', fontsize=11,
             style='italic', ha='center')
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     if output_path:
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
+        fig.savefig(output_path, dpi=100)
         print(f"Saved race condition timeline to {output_path}")
     else:
         plt.show()
     
-    plt.close()
+    if owns_fig:
+        plt.close(fig)
 
 
-def visualize_peterson_graph(output_path=None):
+def visualize_peterson_graph(output_path=None, fig=None):
     """
     Create a directed graph showing Peterson's algorithm state transitions.
     Demonstrates that mutual exclusion is preserved.
     """
-    sm = PetersonStateMachine()
+    sm = _peterson_sm()
     
     # Verify mutual exclusion
     is_safe = sm.verify_mutual_exclusion()
     
-    # Create directed graph
-    G = nx.DiGraph()
-    
-    # Add nodes
+    # Node labels
+    labels = []
     for idx, state in enumerate(sm.states):
         label = f"S{idx}\nP1:{state.p1_state.value[:4]}\nP2:{state.p2_state.value[:4]}"
         label += f"\nf1={int(state.flag1)} f2={int(state.flag2)}\nturn={state.turn}"
-        G.add_node(idx, label=label, state=state)
-    
-    # Add edges
-    for trans in sm.transitions:
-        from_idx = sm.states.index(trans.from_state)
-        to_idx = sm.states.index(trans.to_state)
-        G.add_edge(from_idx, to_idx, action=trans.action, process=trans.process)
-    
-    # Create figure
-    plt.figure(figsize=(16, 12))
-    
-    # Use spring layout
-    pos = nx.spring_layout(G, k=2.5, iterations=50, seed=43)
+        labels.append(label)
     
     # Color nodes based on state
-    node_colors = []
-    for idx in G.nodes():
-        state = sm.states[idx]
-        if state.p1_state == ProcessState.CRITICAL or state.p2_state == ProcessState.CRITICAL:
-            node_colors.append('#95E1D3')  # Green for critical section
-        elif state.p1_state == ProcessState.WAITING or state.p2_state == ProcessState.WAITING:
-            node_colors.append('#FFE66D')  # Yellow for waiting
-        else:
-            node_colors.append('#4ECDC4')  # Cyan for idle
-    
-    # Draw the graph
-    nx.draw_networkx_nodes(G, pos, node_color=node_colors, 
-                          node_size=3500, alpha=0.9, edgecolors='black', linewidths=2)
-    
-    # Draw labels
-    labels = nx.get_node_attributes(G, 'label')
-    nx.draw_networkx_labels(G, pos, labels, font_size=8, font_weight='bold')
-    
-    # Draw edges
-    nx.draw_networkx_edges(G, pos, edge_color='gray', arrows=True,
-                          arrowsize=20, arrowstyle='->', width=2,
-                          connectionstyle='arc3,rad=0.1')
-    
-    # Add edge labels
-    edge_labels = {}
-    for u, v, data in G.edges(data=True):
-        action = data['action']
-        if len(action) > 25:
-            action = action[:22] + "..."
-        edge_labels[(u, v)] = action
-    
-    nx.draw_networkx_edge_labels(G, pos, edge_labels, font_size=6)
+    node_colors = [_PETERSON_NODE_COLORS[(s.p1_state, s.p2_state)] for s in sm.states]
+    
+    # Create figure and draw the graph
+    owns_fig = fig is None
+    fig = _prepare_figure(fig, (16, 12))
+    ax = fig.subplots()
+    _draw_state_graph(ax, sm, _shell_layout(sm.states, _peterson_shell, _peterson_angle), labels, node_colors, node_size=3500,
+                      font_size=8, edge_font_size=6, max_action_len=25)
     
     # Add title
     status = "MUTUAL EXCLUSION VERIFIED" if is_safe else "VIOLATION DETECTED"
     color = 'green' if is_safe else 'red'
-    plt.title(f"Peterson's Algorithm State Transition Graph\n{status}\n" + 
+    ax.set_title(f"Peterson's Algorithm State Transition Graph\n{status}\n" + 
              "Green = Critical Section | Yellow = Waiting | Cyan = Idle",
              fontsize=16, fontweight='bold', pad=20, color=color)
     
-    plt.axis('off')
-    plt.tight_layout()
+    fig.tight_layout()
     
     if output_path:
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
+        fig.savefig(output_path, dpi=100)
         print(f"Saved Peterson's algorithm graph to {output_path}")
     else:
         plt.show()
     
-    plt.close()
+    if owns_fig:
+        plt.close(fig)
 
 
-def visualize_peterson_timeline(output_path=None):
+def visualize_peterson_timeline(output_path=None, use_template=True, fig=None):
     """
     Create a timeline visualization showing Peterson's algorithm in action.
+    Saving copies PETERSON_TIMELINE_TEMPLATE; pass use_template=False to render
+    with matplotlib instead (e.g. to regenerate the template).
     """
-    fig, ax = plt.subplots(figsize=(14, 8))
+    if output_path and use_template and os.path.exists(PETERSON_TIMELINE_TEMPLATE):
+        shutil.copyfile(PETERSON_TIMELINE_TEMPLATE, output_path)
+        print(f"Saved Peterson's algorithm timeline to {output_path}")
+        return
+    
+    owns_fig = fig is None
+    fig = _prepare_figure(fig, (14, 8))
+    ax = fig.subplots()
     
     ax.set_title("Peterson's Algorithm: Mutual Exclusion Guaranteed", fontsize=14, fontweight='bold')
     ax.set_xlim(0, 20)
@@ -303,27 +415,32 @@ def visualize_peterson_timeline(output_path=None):
            fontsize=12, color='green', fontweight='bold', ha='center',
            bbox=dict(boxstyle='round', facecolor='lightgreen', edgecolor='green', linewidth=2))
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     if output_path:
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
+        fig.savefig(output_path, dpi=100)
         print(f"Saved Peterson's algorithm timeline to {output_path}")
     else:
         plt.show()
     
-    plt.close()
+    if owns_fig:
+        plt.close(fig)
 
 
 if __name__ == "__main__":
     print("Generating visualizations...")
     os.makedirs("animations", exist_ok=True)
     
+    # One figure reused across all four renders
+    fig = plt.figure()
+    
     print("\n1. Race Condition Visualizations")
-    visualize_race_condition_graph("animations/race_condition_graph.png")
-    visualize_race_condition_timeline("animations/race_condition_timeline.png")
+    visualize_race_condition_graph("animations/race_condition_graph.png", fig=fig)
+    visualize_race_condition_timeline("animations/race_condition_timeline.png", fig=fig)
     
     print("\n2. Peterson's Algorithm Visualizations")
-    visualize_peterson_graph("animations/peterson_graph.png")
-    visualize_peterson_timeline("animations/peterson_timeline.png")
+    visualize_peterson_graph("animations/peterson_graph.png", fig=fig)
+    visualize_peterson_timeline("animations/peterson_timeline.png", fig=fig)
     
+    plt.close(fig)
     print("\nAll visualizations generated successfully!")